@@ -1,20 +1,31 @@
 """diary-digest: Analyze and extract information from diary files."""
 
 import fnmatch
-import json
 import re
 import sys
 from collections import defaultdict
+from operator import itemgetter
 from pathlib import Path
 
 import click
 
 from diary_md.exceptions import DiaryParseError
 from diary_md.exchange import get_exchange_rate
-from diary_md.parser import markdown_to_dict, parse_diary_to_list
+from diary_md.parser import looks_like_date_header, markdown_to_dict, parse_diary_to_list
 
 DATE_FORMAT = "%Y-%m-%d"
 
+# Pattern for the annotations in the details part of an expense line.
+# The lookaheads pick up the first "- paid by NAME" and " - DIV<n>"
+# anywhere in the details, so one match extracts both.
+_ANNOTATION_RE = re.compile(
+    r"(?=(?:.*?- paid by (?P<payer>[^ ]*))?)"
+    r"(?=(?:.*? - DIV(?P<divisor>\d+))?)"
+)
+
+# Internal keys added by markdown_to_dict, always allowed as subsections
+_INTERNAL_KEYS = frozenset({'__content__', '__file_position__', '__file_name__'})
+
 # Default config file location
 DEFAULT_CONFIG_FILE = Path.home() / ".config" / "diary-md" / "config.json"
 
@@ -40,6 +51,9 @@ def load_config(config_file: Path | None = None) -> dict:
         "allowable_subsections": ["default", "sections", "..."]
     }
     """
+    # json is only needed by a few subcommands, so import it on use
+    import json
+
     if config_file is None:
         config_file = DEFAULT_CONFIG_FILE
 
@@ -69,6 +83,17 @@ def get_config_for_diary(cfg: dict, diary_path: str) -> dict:
     return cfg
 
 
+def get_diary_list(ctx: click.Context) -> list[dict]:
+    """Get the diary entry list, parsing it from md_dict on first use.
+
+    Not every subcommand needs the entry list (find-all-subsections only
+    walks md_dict), so it is not built up front.
+    """
+    if 'diary_list' not in ctx.obj:
+        ctx.obj['diary_list'] = parse_diary_to_list(ctx.obj['md_dict'], start=ctx.obj['start'], end=ctx.obj['end'])
+    return ctx.obj['diary_list']
+
+
 @click.group()
 @click.option('--start', help='Only show dates at or after this date', type=click.DateTime(formats=[DATE_FORMAT]))
 @click.option('--begin', 'start', help='alias for start', type=click.DateTime(formats=[DATE_FORMAT]))
@@ -82,14 +107,24 @@ def get_config_for_diary(cfg: dict, diary_path: str) -> dict:
 def digest(ctx, diary, start, end):
     """Analyze and extract information from markdown diary files."""
     ctx.ensure_object(dict)
-    ctx.obj['md_dict'] = {}
+    md_dict: dict = {}
     ctx.obj['diary_paths'] = []
     for d in diary:
-        ctx.obj['md_dict'].update(markdown_to_dict(d))
+        # Each diary is parsed on its own so that file names and the
+        # no-top-level-header detection stay per file. Only merge when
+        # there is something to merge into.
+        parsed = markdown_to_dict(d)
+        if md_dict:
+            md_dict.update(parsed)
+        else:
+            md_dict = parsed
         # Track diary paths for config lookup
         if hasattr(d, 'name') and d.name != '<stdin>':
             ctx.obj['diary_paths'].append(d.name)
-    ctx.obj['diary_list'] = parse_diary_to_list(ctx.obj['md_dict'], start=start, end=end)
+    ctx.obj['md_dict'] = md_dict
+    # The entry list is built on demand, see get_diary_list()
+    ctx.obj['start'] = start
+    ctx.obj['end'] = end
 
 
 @digest.command()
@@ -97,28 +132,36 @@ def digest(ctx, diary, start, end):
 @click.option('--section', multiple=True, help='Section(s) to extract')
 def select_subsection(ctx, section):
     """Extract specific subsections from diary entries."""
+    # Collect output and write it in one go rather than line by line
+    out = []
+    section_set = set(section)
     header = ""
-    for x in ctx.obj['diary_list']:
+    for x in get_diary_list(ctx):
         if x['trip'] != header:
-            click.echo(f"# {x['trip']}")
-            click.echo()
+            out.append(f"# {x['trip']}")
+            out.append("")
             header = x['trip']
-        day_print = False
+        present = section_set.intersection(x)
+        if not present:
+            continue
+        out.append(f"## {x['dow']} {x['date']} {x['itenary']}")
+        out.append("")
         for s in section:
-            if s in x:
-                if not day_print:
-                    click.echo(f"## {x['dow']} {x['date']} {x['itenary']}")
-                    click.echo()
-                    day_print = True
-                click.echo(f"### {s}")
-                click.echo(x[s]['__content__'])
+            if s in present:
+                out.append(f"### {s}")
+                out.append(x[s]['__content__'])
+
+    if out:
+        click.echo("\n".join(out))
 
 
 @digest.command()
 @click.pass_context
 def export_json(ctx):
     """Export diary as JSON."""
-    click.echo(json.dumps(ctx.obj['diary_list']))
+    import json
+
+    click.echo(json.dumps(get_diary_list(ctx)))
 
 
 @digest.command()
@@ -149,26 +192,20 @@ def find_all_subsections(ctx, config):
         allowable_from_config = cfg.get('allowable_subsections', [])
 
     # Always allow internal keys
-    allowable_subsection_titles = {'__content__', '__file_position__', '__file_name__'}
-    allowable_subsection_titles.update(allowable_from_config)
+    allowable_subsection_titles = _INTERNAL_KEYS.union(allowable_from_config)
 
     subsection_titles = set()
-
-    def _looks_like_date(key: str) -> bool:
-        """Check if key looks like a date header."""
-        import re
-        return bool(re.match(r'^[A-Za-zæøåÆØÅ]+ 20\d\d-\d\d-\d\d', key))
+    out = []
 
     # Check if top-level keys are date headers (no trip wrapper)
     non_meta_keys = [k for k in md_dict if not k.startswith('__')]
-    direct_dates = non_meta_keys and all(_looks_like_date(k) for k in non_meta_keys)
+    direct_dates = non_meta_keys and all(looks_like_date_header(k) for k in non_meta_keys)
 
     if direct_dates:
         # Top-level is date headers directly
-        for day in md_dict:
+        for day, day_data in md_dict.items():
             if not isinstance(day, str) or day.startswith('__'):
                 continue
-            day_data = md_dict[day]
             if not isinstance(day_data, dict):
                 continue
             for subtitle in day_data:
@@ -176,16 +213,15 @@ def find_all_subsections(ctx, config):
                     continue
                 subsection_titles.add(subtitle)
                 if allowable_from_config and subtitle not in allowable_subsection_titles:
-                    click.echo(f"Not allowed: {subtitle} in {day}")
+                    out.append(f"Not allowed: {subtitle} in {day}")
     else:
         # Normal structure: trip headers containing date headers
-        for headline in md_dict:
-            if not isinstance(md_dict[headline], dict):
+        for headline, days in md_dict.items():
+            if not isinstance(days, dict):
                 continue
-            for day in md_dict[headline]:
+            for day, day_data in days.items():
                 if not isinstance(day, str) or day.startswith('__'):
                     continue
-                day_data = md_dict[headline][day]
                 if not isinstance(day_data, dict):
                     continue
                 for subtitle in day_data:
@@ -193,30 +229,62 @@ def find_all_subsections(ctx, config):
                         continue
                     subsection_titles.add(subtitle)
                     if allowable_from_config and subtitle not in allowable_subsection_titles:
-                        click.echo(f"Not allowed: {subtitle} in {headline}->{day}")
+                        out.append(f"Not allowed: {subtitle} in {headline}->{day}")
 
     if allowable_from_config:
         user_allowable = set(allowable_from_config)
-        click.echo(f"Allowable, but missing: {user_allowable - subsection_titles!r}")
-        click.echo(f"Not allowable, but found: {subsection_titles - user_allowable!r}")
+        out.append(f"Allowable, but missing: {user_allowable - subsection_titles!r}")
+        out.append(f"Not allowable, but found: {subsection_titles - user_allowable!r}")
     else:
-        click.echo(f"Found subsections: {subsection_titles!r}")
-        click.echo(f"(No config file found at {DEFAULT_CONFIG_FILE} - showing all found sections)")
+        out.append(f"Found subsections: {subsection_titles!r}")
+        out.append(f"(No config file found at {DEFAULT_CONFIG_FILE} - showing all found sections)")
+
+    click.echo("\n".join(out))
+
+
+def _split_expense_line(line: str) -> tuple[str, str, str] | None:
+    """Split '* CUR AMOUNT - details' into (currency, amount, details).
+
+    Returns None if the line is not an expense line.
+    """
+    if not line.startswith('* ') or len(line) < 6 or line[5] != ' ':
+        return None
+    currency = line[2:5]
+    if not (currency.isascii() and currency.isalpha() and currency.isupper()):
+        return None
+
+    amount, sep, details = line[6:].partition(' - ')
+    if not sep:
+        return None
+    whole, dot, fraction = amount.removeprefix('-').partition('.')
+    if not whole.isdecimal() or (dot and not fraction.isdecimal()):
+        return None
+
+    return currency, amount, details
 
 
 @digest.command()
 @click.pass_context
 def expenses(ctx):
     """Summarize expenses from diary entries."""
+    base_currency = 'EUR'
+
     unaccounted_content = []
+    out = []
+    # (amount in base currency, details, payer, divisor) per expense line
     accounted = []
+    conversion_warnings = []
+    # Exchange rates by (currency, date); None (unknown currency) is cached too
+    rate_cache: dict[tuple[str, str], float | None] = {}
 
-    for entry in ctx.obj['diary_list']:
-        if 'Expenses' not in entry:
+    for entry in get_diary_list(ctx):
+        expenses_section = entry.get('Expenses')
+        if expenses_section is None:
             continue
 
         unaccounted = ""
-        if '__content__' not in entry['Expenses']:
+        content = expenses_section.get('__content__')
+        if content is None:
             raise DiaryParseError(
                 "Expenses section has no content",
                 file_name=entry.get('__file_name__'),
@@ -226,90 +294,92 @@ def expenses(ctx):
             )
 
         expense_date = entry['date']  # YYYY-MM-DD format
-        expenses_text = entry['Expenses']['__content__'].strip().split('\n')
+        expenses_text = content.splitlines()
 
         for expense in expenses_text:
             if not unaccounted:
                 expense = expense.strip()
                 if not expense:
                     continue
-            findings = re.match(r"^\* ([A-Z]{3}) (-?\d+(?:\.\d+)?) - (.*)$", expense)
-            if findings:
-                accounted.append((findings.group(1), findings.group(2), findings.group(3), expense_date))
-            else:
+            findings = _split_expense_line(expense)
+            if not findings:
                 unaccounted += expense
+                continue
+
+            currency, amount, details = findings
+            amount = float(amount)
+
+            # Convert to the base currency up front (slow path only for
+            # foreign currencies), so the totals loop below is uniform
+            if currency != base_currency:
+                try:
+                    rate = rate_cache[currency, expense_date]
+                except KeyError:
+                    rate = rate_cache[currency, expense_date] = get_exchange_rate(currency, expense_date)
+                if rate is None:
+                    conversion_warnings.append(f"Unknown currency {currency} on {expense_date}")
+                    continue
+                amount *= rate
+
+            annotations = _ANNOTATION_RE.match(details)
+            divisor = annotations['divisor']
+            accounted.append((
+                amount, details, annotations['payer'],
+                int(divisor) if divisor is not None else None
+            ))
 
         if unaccounted:
             unaccounted_content.append(f"## {entry['dow']} {entry['date']} {entry['itenary']}\n")
             unaccounted_content.append(unaccounted)
 
-    base_currency = 'EUR'
-
     my_expenses = 0
     total_expenses = 0
     shared_expenses_per_head = 0
     paid_by = defaultdict(float)
     expenses_by_category = defaultdict(float)
-    conversion_warnings = []
-
-    for expense in accounted:
-        (currency, amount, details, expense_date) = expense
-        amount = float(amount)
-
-        if currency != base_currency:
-            rate = get_exchange_rate(currency, expense_date)
-            if rate is None:
-                conversion_warnings.append(f"Unknown currency {currency} on {expense_date}")
-                continue
-            amount = amount * rate
-            currency = base_currency
 
+    for amount, details, payer, divisor in accounted:
         total_expenses += amount
-        category = details.split(' - ')[0]
-        if ' (' in category:
-            category = category.split(' (')[0]
+        category = details.partition(' - ')[0].partition(' (')[0]
 
-        paidbyf = re.search(r"- paid by ([^ ]*)", details)
-        if paidbyf:
-            paid_by[paidbyf.group(1)] += amount
+        if payer is not None:
+            paid_by[payer] += amount
 
-        sharedf = re.search(r" - DIV(\d+)", details)
-        if sharedf:
-            divisor = int(sharedf.group(1))
+        if divisor is not None:
             amount /= divisor
             shared_expenses_per_head += amount
 
         expenses_by_category[category] += amount
         my_expenses += amount
 
-    click.echo("# Unaccounted text under expenses (look through)")
-    click.echo()
-    click.echo("\n".join(unaccounted_content))
-    click.echo("# Expenses by payer")
-    click.echo()
-    for payer in paid_by:
-        click.echo(f" * {base_currency} {paid_by[payer]:5.2f} - {payer}")
-    click.echo()
-    click.echo("# Expenses by category")
-    click.echo()
-    categories = list(expenses_by_category.keys())
-    categories.sort(key=lambda x: expenses_by_category[x])
-    for cat in categories:
-        click.echo(f" * {base_currency} {expenses_by_category[cat]:5.2f} - {cat}")
-    click.echo()
+    out.append("# Unaccounted text under expenses (look through)")
+    out.append("")
+    out.append("\n".join(unaccounted_content))
+    out.append("# Expenses by payer")
+    out.append("")
+    for payer, amount in paid_by.items():
+        out.append(f" * {base_currency} {amount:5.2f} - {payer}")
+    out.append("")
+    out.append("# Expenses by category")
+    out.append("")
+    categories = sorted(expenses_by_category.items(), key=itemgetter(1))
+    out.extend(f" * {base_currency} {amount:5.2f} - {cat}" for cat, amount in categories)
+    out.append("")
 
     if conversion_warnings:
-        click.echo("# Currency conversion warnings")
-        click.echo()
+        out.append("# Currency conversion warnings")
+        out.append("")
         for warning in conversion_warnings:
-            click.echo(f" * {warning}")
-        click.echo()
-
-    click.echo("# Totals")
-    click.echo()
-    click.echo(f"Total expenses: {base_currency} {total_expenses:5.2f}")
-    click.echo(f"Shared expenses per head: {base_currency} {shared_expenses_per_head:5.2f}")
-    click.echo(f"My expenses: {base_currency} {my_expenses:5.2f}")
+            out.append(f" * {warning}")
+        out.append("")
+
+    out.append("# Totals")
+    out.append("")
+    out.append(f"Total expenses: {base_currency} {total_expenses:5.2f}")
+    out.append(f"Shared expenses per head: {base_currency} {shared_expenses_per_head:5.2f}")
+    out.append(f"My expenses: {base_currency} {my_expenses:5.2f}")
+
+    click.echo("\n".join(out))
 
 
 def main():
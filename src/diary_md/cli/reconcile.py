@@ -2,21 +2,32 @@
 
 import csv
 import json
+import os
 import re
+import shutil
 import sys
-from dataclasses import dataclass
+import tempfile
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterator
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
+from typing import TextIO
 
 import click
 
 from diary_md.git import git_commit_multiple_repos
-from diary_md.models import SUPPORTED_CURRENCIES
+from diary_md.models import SUPPORTED_CURRENCY_SET
+from diary_md.parser import parse_iso_date
 
 
-@dataclass
+@dataclass(slots=True)
 class Expense:
     """An expense from bank statement."""
+    # date and amount must not change after construction, as
+    # __post_init__ derives date_ord, date_str and amount_str from them
     date: datetime
     amount: float  # Always positive for expenses, original currency
     currency: str
@@ -27,11 +38,24 @@ class Expense:
     source_file: str
     line_num: int
     merchant_category: str = ''
+    # Prepared description for text matching, see match_words()
+    words: 'MatchWords | None' = field(default=None, repr=False, compare=False)
+    date_ord: int = field(init=False, repr=False, compare=False)
+    # Date and amount as written in markers, keys and output
+    date_str: str = field(init=False, repr=False, compare=False)
+    amount_str: str = field(init=False, repr=False, compare=False)
 
+    def __post_init__(self):
+        self.date_ord = self.date.toordinal()
+        self.currency = sys.intern(self.currency)
+        self.date_str = self.date.strftime('%Y-%m-%d')
+        self.amount_str = f'{self.amount:.2f}'
 
-@dataclass
+
+@dataclass(slots=True)
 class DiaryExpense:
     """An expense from diary."""
+    # date must not change after construction, date_ord is derived from it
     date: datetime
     amount: float
     currency: str
@@ -41,6 +65,27 @@ class DiaryExpense:
     line_num: int
     original_line: str
     split_marker: str | None = None
+    # Prepared description for text matching, see match_words()
+    words: 'MatchWords | None' = field(default=None, repr=False, compare=False)
+    date_ord: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.date_ord = self.date.toordinal()
+        self.currency = sys.intern(self.currency)
+        self.expense_type = sys.intern(self.expense_type)
+
+
+# Alias-expanded words of a description, and the canonical names the
+# whole description is an alias of
+MatchWords = tuple[frozenset[str], set[str]]
+
+# Non-split diary expenses grouped by currency, each group sorted by date:
+# {currency: ([date ordinals], [(position in diary list, DiaryExpense)])}
+DiaryIndex = dict[str, tuple[list[int], list[tuple[int, DiaryExpense]]]]
+
+# Split markers grouped by (bank, currency), each group sorted by marker date:
+# {(bank, currency): ([date ordinals], [(marker position, amount, count, [DiaryExpense])])}
+SplitIndex = dict[tuple[str, str], tuple[list[int], list[tuple[int, float, int, list[DiaryExpense]]]]]
 
 
 # Default diary files to check
@@ -85,17 +130,54 @@ def load_aliases(filepath: Path | None) -> dict[str, set[str]]:
     return aliases
 
 
+def _read_csv_rows(f: TextIO) -> tuple[dict[str, int], Iterator[list[str]]]:
+    """Read a CSV file with a header line.
+
+    Returns the column index of each header name, and the data rows as
+    lists of values. Empty lines are skipped, like csv.DictReader does.
+    Each row is padded or cut to the header width plus one empty value, so
+    that .get(name, -1) on the column index gives a column that is always
+    '' if the file doesn't have it (values beyond the header are dropped).
+    """
+    reader = csv.reader(f)
+    header = next(reader, [])
+    width = len(header)
+    padding = [''] * (width + 1)
+
+    def rows() -> Iterator[list[str]]:
+        for row in reader:
+            if not row:
+                continue
+            if len(row) == width:
+                row.append('')
+            elif len(row) > width:
+                row = row[:width] + ['']
+            else:
+                row = (row + padding)[:width + 1]
+            yield row
+
+    return {name: i for i, name in enumerate(header)}, rows()
+
+
 def parse_n26_csv(filepath: Path, bank_currency: str = 'EUR') -> list[Expense]:
     """Parse N26 CSV export file."""
     expenses = []
 
     with open(filepath, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for line_num, row in enumerate(reader, start=2):
+        columns, rows = _read_csv_rows(f)
+        amount_cols = [columns[c] for c in ['Amount (EUR)', 'Amount', 'Beloep', 'Summa'] if c in columns]
+        date_cols = [columns[c] for c in ['Value Date', 'Booking Date', 'Date', 'Dato', 'Datum'] if c in columns]
+        description_cols = [
+            columns[c] for c in ['Partner Name', 'Description', 'Beskrivelse', 'Payment Reference'] if c in columns
+        ]
+        original_amount_col = columns.get('Original Amount', -1)
+        original_currency_col = columns.get('Original Currency', -1)
+
+        for line_num, row in enumerate(rows, start=2):
             try:
                 deducted_amount = None
-                for col in ['Amount (EUR)', 'Amount', 'Beloep', 'Summa']:
-                    if col in row and row[col]:
+                for col in amount_cols:
+                    if row[col]:
                         try:
                             deducted_amount = float(row[col].replace(',', '.'))
                             break
@@ -108,23 +190,23 @@ def parse_n26_csv(filepath: Path, bank_currency: str = 'EUR') -> list[Expense]:
                 deducted_amount = abs(deducted_amount)
 
                 date_str = None
-                for col in ['Value Date', 'Booking Date', 'Date', 'Dato', 'Datum']:
-                    if col in row and row[col]:
+                for col in date_cols:
+                    if row[col]:
                         date_str = row[col]
                         break
 
                 if not date_str:
                     continue
-                date = datetime.strptime(date_str, '%Y-%m-%d')
+                date = parse_iso_date(date_str)
 
                 description = ''
-                for col in ['Partner Name', 'Description', 'Beskrivelse', 'Payment Reference']:
-                    if col in row and row[col]:
+                for col in description_cols:
+                    if row[col]:
                         description = row[col]
                         break
 
-                original_amount = row.get('Original Amount', '').strip()
-                original_currency = row.get('Original Currency', '').strip()
+                original_amount = row[original_amount_col].strip()
+                original_currency = row[original_currency_col].strip()
 
                 if original_amount and original_currency:
                     amount = abs(float(original_amount.replace(',', '.')))
@@ -156,25 +238,36 @@ def parse_wise_csv(filepath: Path, default_currency: str = 'EUR') -> list[Expens
     expenses = []
 
     with open(filepath, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for line_num, row in enumerate(reader, start=2):
+        columns, rows = _read_csv_rows(f)
+        status_col = columns.get('Status', -1)
+        direction_col = columns.get('Direction', -1)
+        finished_col = columns.get('Finished on', -1)
+        created_col = columns.get('Created on', -1)
+        source_amount_col = columns.get('Source amount (after fees)', -1)
+        source_currency_col = columns.get('Source currency', -1)
+        target_amount_col = columns.get('Target amount (after fees)', -1)
+        target_currency_col = columns.get('Target currency', -1)
+        target_name_col = columns.get('Target name', -1)
+        note_col = columns.get('Note', -1)
+
+        for line_num, row in enumerate(rows, start=2):
             try:
-                if row.get('Status') != 'COMPLETED':
+                if row[status_col] != 'COMPLETED':
                     continue
-                if row.get('Direction') != 'OUT':
+                if row[direction_col] != 'OUT':
                     continue
 
-                date_str = row.get('Finished on') or row.get('Created on')
+                date_str = row[finished_col] or row[created_col]
                 if not date_str:
                     continue
-                date = datetime.strptime(date_str.split()[0], '%Y-%m-%d')
+                date = parse_iso_date(date_str.split()[0])
 
-                source_amount_str = row.get('Source amount (after fees)', '').strip()
-                source_currency = row.get('Source currency', '').strip() or default_currency
+                source_amount_str = row[source_amount_col].strip()
+                source_currency = row[source_currency_col].strip() or default_currency
                 deducted_amount = abs(float(source_amount_str.replace(',', '.'))) if source_amount_str else 0
 
-                target_amount = row.get('Target amount (after fees)', '').strip()
-                target_currency = row.get('Target currency', '').strip()
+                target_amount = row[target_amount_col].strip()
+                target_currency = row[target_currency_col].strip()
 
                 if target_amount and target_currency:
                     amount = abs(float(target_amount.replace(',', '.')))
@@ -186,8 +279,8 @@ def parse_wise_csv(filepath: Path, default_currency: str = 'EUR') -> list[Expens
                     else:
                         continue
 
-                target_name = row.get('Target name', '').strip()
-                note = row.get('Note', '').strip()
+                target_name = row[target_name_col].strip()
+                note = row[note_col].strip()
                 description = target_name
                 if note:
                     description = f"{target_name} ({note})"
@@ -210,6 +303,15 @@ def parse_wise_csv(filepath: Path, default_currency: str = 'EUR') -> list[Expens
     return expenses
 
 
+# Namespaced SpreadsheetML tags used when streaming XLSX worksheets
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_SI = _XLSX_NS + 'si'
+_XLSX_T = _XLSX_NS + 't'
+_XLSX_ROW = _XLSX_NS + 'row'
+_XLSX_C = _XLSX_NS + 'c'
+_XLSX_V = _XLSX_NS + 'v'
+
+
 def parse_banknorwegian_xlsx(filepath: Path) -> list[Expense]:
     """Parse Bank Norwegian XLSX export file."""
     import xml.etree.ElementTree as ET
@@ -226,29 +328,30 @@ def parse_banknorwegian_xlsx(filepath: Path) -> list[Expense]:
             shared_strings = []
             try:
                 with zf.open('xl/sharedStrings.xml') as f:
-                    tree = ET.parse(f)
-                    ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-                    for si in tree.findall('.//x:si', ns):
-                        texts = [t.text or '' for t in si.findall('.//x:t', ns)]
-                        shared_strings.append(''.join(texts))
+                    for _, si in ET.iterparse(f):
+                        if si.tag == _XLSX_SI:
+                            shared_strings.append(''.join(t.text or '' for t in si.iter(_XLSX_T)))
+                            si.clear()
             except KeyError:
                 pass
 
             with zf.open('xl/worksheets/sheet1.xml') as f:
-                tree = ET.parse(f)
-                ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-
-                rows = tree.findall('.//x:row', ns)
-
-                for row in rows[1:]:
+                first_row = True
+                for _, row in ET.iterparse(f):
+                    if row.tag != _XLSX_ROW:
+                        continue
+                    if first_row:
+                        first_row = False
+                        row.clear()
+                        continue
                     try:
-                        cells = {c.attrib.get('r', '')[0]: c for c in row.findall('x:c', ns)}
+                        cells = {c.attrib.get('r', '')[0]: c for c in row.iterfind(_XLSX_C)}
 
                         def get_value(col: str, cells=cells) -> str:
                             cell = cells.get(col)
                             if cell is None:
                                 return ''
-                            v_elem = cell.find('x:v', ns)
+                            v_elem = cell.find(_XLSX_V)
                             if v_elem is None or v_elem.text is None:
                                 return ''
                             if cell.attrib.get('t') == 's':
@@ -301,6 +404,9 @@ def parse_banknorwegian_xlsx(filepath: Path) -> list[Expense]:
                         ))
                     except (ValueError, KeyError, IndexError):
                         continue
+                    finally:
+                        # Rows are handled one at a time, don't keep them around
+                        row.clear()
     except (OSError, zipfile.BadZipFile) as e:
         click.echo(f"Error reading {filepath}: {e}", err=True)
 
@@ -323,6 +429,7 @@ def parse_remember_json(filepath: Path) -> list[Expense]:
                 data = json.load(f)
 
             transactions = data.get('transactions', [])
+            source_file = str(json_file)
 
             for tx in transactions:
                 try:
@@ -343,7 +450,7 @@ def parse_remember_json(filepath: Path) -> list[Expense]:
                     date_str = tx.get('transactionDate', '')
                     if not date_str:
                         continue
-                    date = datetime.strptime(date_str[:10], '%Y-%m-%d')
+                    date = parse_iso_date(date_str[:10])
 
                     currency = tx.get('transactionCurrency', 'NOK')
                     billing_currency = tx.get('billingCurrency', 'NOK')
@@ -354,15 +461,14 @@ def parse_remember_json(filepath: Path) -> list[Expense]:
                         description = f"{description} ({city})"
 
                     reason_code = tx.get('reasonCode') or ''
-                    is_atm = (
-                        reason_code == 'CASH' or
-                        'kontantuttak' in description.lower() or
-                        'gebyr kontantuttak' in description.lower()
-                    )
+                    # Lowercased once, the 'ATM: ' prefix added below doesn't matter to the fee check
+                    description_lower = description.lower()
+                    # This also catches the ATM fees ('gebyr kontantuttak')
+                    is_atm = reason_code == 'CASH' or 'kontantuttak' in description_lower
                     if is_atm and not description.startswith('ATM:'):
                         description = f"ATM: {description}"
 
-                    if reason_code == 'fee' or 'valutapaaslag' in description.lower():
+                    if reason_code == 'fee' or 'valutapaaslag' in description_lower:
                         continue
 
                     expenses.append(Expense(
@@ -373,7 +479,7 @@ def parse_remember_json(filepath: Path) -> list[Expense]:
                         bank='Remember',
                         bank_currency=billing_currency,
                         deducted_amount=billing_amount,
-                        source_file=str(json_file),
+                        source_file=source_file,
                         line_num=tx_id or 0,
                         merchant_category=''
                     ))
@@ -386,20 +492,114 @@ def parse_remember_json(filepath: Path) -> list[Expense]:
     return expenses
 
 
+# A diary line is either a date header or an expense line (see ExpenseLine for the type group)
+_DIARY_LINE_RE = re.compile(
+    r'^(?:## \w+ (?P<date>\d{4}-\d{2}-\d{2})'
+    r'|\* (?P<currency>[A-Z]{3})\s+(?P<amount>\d+(?:\.\d+)?)'
+    r'\s+-\s+(?P<type>\s|[\w\s]*?\w)\s+-\s+(?P<description>.+)$)'
+)
+_CASH_RE = re.compile(r'\(cash\)', re.IGNORECASE)
+_RECONCILED_MARKER_RE = re.compile(
+    r'\(reconciled:\s*(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)(?:/\d+|/\w+:\d+\.?\d*)?\)'
+)
+_SPLIT_MARKER_RE = re.compile(
+    r'\((reconciled:\s*)?(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)/(\d+)\)'
+)
+# The fields of a split marker as stored in DiaryExpense.split_marker
+_SPLIT_MARKER_FIELDS_RE = re.compile(r'^(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)/(\d+)$')
+
+
+def parse_diary(filepath: Path) -> tuple[list[DiaryExpense], set[tuple]]:
+    """Parse a diary file in one pass.
+
+    Returns the expense entries still to be reconciled, and the
+    reconciliation markers already in the file.
+    """
+    expenses = []
+    markers = set()
+
+    if not filepath.exists():
+        return expenses, markers
+
+    source_file = str(filepath)
+    current_date = None
+
+    # Universal newlines turn any line ending into '\n' (unlike str.splitlines(), which
+    # also splits on form feeds etc.), so line numbers stay the same as for readlines()
+    text = filepath.read_text(encoding='utf-8')
+    for line_num, original_line in enumerate(text.split('\n'), start=1):
+        line = original_line.strip()
+
+        if '(reconciled:' in line:
+            for marker_match in _RECONCILED_MARKER_RE.finditer(line):
+                bank, date, currency, amount = marker_match.groups()
+                markers.add((bank, date, currency, f"{float(amount):.2f}"))
+
+        line_match = _DIARY_LINE_RE.match(line)
+        if not line_match:
+            continue
+
+        date_str = line_match.group('date')
+        if date_str:
+            current_date = parse_iso_date(date_str)
+            continue
+
+        if current_date:
+            split_match = _SPLIT_MARKER_RE.search(line) if '/' in line else None
+            split_marker = None
+            if split_match:
+                is_reconciled = split_match.group(1) is not None
+                if is_reconciled:
+                    continue
+                split_marker = f"{split_match.group(2)} - {split_match.group(3)} - {split_match.group(4)}:{split_match.group(5)}/{split_match.group(6)}"
+            elif '(reconciled:' in line:
+                continue
+
+            if _CASH_RE.search(line):
+                continue
+
+            currency = line_match.group('currency')
+            if currency not in SUPPORTED_CURRENCY_SET:
+                continue
+            try:
+                amount = float(line_match.group('amount'))
+            except ValueError:
+                continue
+            expense_type = line_match.group('type')
+            description = line_match.group('description')
+
+            expenses.append(DiaryExpense(
+                date=current_date,
+                amount=amount,
+                currency=currency,
+                expense_type=expense_type,
+                description=description,
+                source_file=source_file,
+                line_num=line_num,
+                original_line=original_line,
+                split_marker=split_marker
+            ))
+
+    return expenses, markers
+
+
+def parse_diary_expenses(filepath: Path) -> list[DiaryExpense]:
+    """Parse expense entries from a diary file."""
+    return parse_diary(filepath)[0]
+
+
 def get_reconciled_markers(filepath: Path) -> set[tuple]:
     """Extract reconciliation markers from diary file."""
     markers = set()
     if not filepath.exists():
         return markers
 
-    marker_pattern = re.compile(
-        r'\(reconciled:\s*(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)(?:/\d+|/\w+:\d+\.?\d*)?\)'
-    )
-
     try:
         with open(filepath, encoding='utf-8') as f:
             for line in f:
-                for match in marker_pattern.finditer(line):
+                if '(reconciled:' not in line:
+                    continue
+                for match in _RECONCILED_MARKER_RE.finditer(line):
                     bank, date, currency, amount = match.groups()
                     markers.add((bank, date, currency, f"{float(amount):.2f}"))
     except OSError:
@@ -408,116 +608,91 @@ def get_reconciled_markers(filepath: Path) -> set[tuple]:
     return markers
 
 
-def parse_diary_expenses(filepath: Path) -> list[DiaryExpense]:
-    """Parse expense entries from a diary file."""
-    expenses = []
+_NOISE_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'of', 'in', 'at', 'to', 'for', 'on', 'from'})
+# Words are runs of ASCII letters and digits; in lowercased ASCII text
+# everything else can simply be turned into spaces
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_WORD_SEPARATORS = ''.join(c if c.islower() or c.isdigit() else ' ' for c in map(chr, range(128)))
 
-    if not filepath.exists():
-        return expenses
 
-    expense_pattern = re.compile(
-        r'^\* (' + '|'.join(SUPPORTED_CURRENCIES) + r')\s+(\d+(?:\.\d+)?)\s+-\s+([\w\s]+?)\s+-\s+(.+)$'
-    )
-    date_pattern = re.compile(r'^## \w+ (\d{4}-\d{2}-\d{2})')
-    reconciled_pattern = re.compile(r'\(reconciled:')
-    cash_pattern = re.compile(r'\(cash\)', re.IGNORECASE)
-    split_marker_pattern = re.compile(
-        r'\((reconciled:\s*)?(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)/(\d+)\)'
-    )
+def normalize_text(text: str) -> set[str]:
+    """Extract words from text for matching."""
+    text = text.lower()
+    if text.isascii():
+        words = text.translate(_WORD_SEPARATORS).split()
+    else:
+        words = _WORD_RE.findall(text)
+    return {w for w in words if len(w) > 2 and w not in _NOISE_WORDS}
 
-    current_date = None
 
-    with open(filepath, encoding='utf-8') as f:
-        for line_num, line in enumerate(f, start=1):
-            original_line = line.rstrip('\n')
-            line = line.strip()
+@lru_cache(maxsize=65536)
+def _normalized_words(text: str) -> frozenset[str]:
+    """Cached normalize_text(), descriptions repeat a lot (same shops)."""
+    return frozenset(normalize_text(text))
 
-            date_match = date_pattern.match(line)
-            if date_match:
-                current_date = datetime.strptime(date_match.group(1), '%Y-%m-%d')
-                continue
 
-            if current_date:
-                expense_match = expense_pattern.match(line)
-                if expense_match:
-                    split_match = split_marker_pattern.search(line)
-                    split_marker = None
-                    if split_match:
-                        is_reconciled = split_match.group(1) is not None
-                        if is_reconciled:
-                            continue
-                        split_marker = f"{split_match.group(2)} - {split_match.group(3)} - {split_match.group(4)}:{split_match.group(5)}/{split_match.group(6)}"
-                    elif reconciled_pattern.search(line):
-                        continue
+def expand_with_aliases(words: set[str] | frozenset[str], aliases: dict[str, set[str]]) -> set[str] | frozenset[str]:
+    """Expand word set with aliases.
 
-                    if cash_pattern.search(line):
-                        continue
+    The alias table maps each word straight to all its canonical names, so
+    this is one lookup per word and a single union. The result has the
+    type of the given word set.
+    """
+    return words.union(*[aliases[word] for word in words if word in aliases])
 
-                    currency = expense_match.group(1)
-                    try:
-                        amount = float(expense_match.group(2))
-                    except ValueError:
-                        continue
-                    expense_type = expense_match.group(3)
-                    description = expense_match.group(4)
 
-                    expenses.append(DiaryExpense(
-                        date=current_date,
-                        amount=amount,
-                        currency=currency,
-                        expense_type=expense_type,
-                        description=description,
-                        source_file=str(filepath),
-                        line_num=line_num,
-                        original_line=original_line,
-                        split_marker=split_marker
-                    ))
+def match_words(text: str, aliases: dict[str, set[str]]) -> MatchWords:
+    """Prepare text for matching.
 
-    return expenses
+    Returns the alias-expanded words of the text, and the canonical names
+    the whole text is an alias of (empty if none).
+    """
+    text = text.lower()
+    expanded = expand_with_aliases(_normalized_words(text), aliases)
+    return expanded, aliases.get(text.strip(), set())
 
 
-def normalize_text(text: str) -> set[str]:
-    """Extract words from text for matching."""
-    text = text.lower()
-    words = re.findall(r'[a-z0-9aouaoeae]+', text)
-    noise = {'the', 'a', 'an', 'and', 'or', 'of', 'in', 'at', 'to', 'for', 'on', 'from'}
-    return {w for w in words if len(w) > 2 and w not in noise}
+def precompute_match_words(expenses: list, aliases: dict[str, set[str]]) -> None:
+    """Store match_words() of each expense description on the expense."""
+    # Expenses with the same description share the (read-only) word sets
+    prepared: dict[str, MatchWords] = {}
+    for expense in expenses:
+        words = prepared.get(expense.description)
+        if words is None:
+            words = prepared[expense.description] = match_words(expense.description, aliases)
+        expense.words = words
 
 
-def expand_with_aliases(words: set[str], aliases: dict[str, set[str]]) -> set[str]:
-    """Expand word set with aliases."""
-    expanded = set(words)
-    for word in words:
-        if word in aliases:
-            expanded.update(aliases[word])
-    return expanded
+def words_match(words1: MatchWords, words2: MatchWords) -> bool:
+    """Check if two prepared texts (see match_words) match."""
+    expanded1, canonical1 = words1
+    expanded2, canonical2 = words2
+    return bool(expanded1 & expanded2 or expanded2 & canonical1 or expanded1 & canonical2)
 
 
 def text_matches_with_aliases(text1: str, text2: str, aliases: dict[str, set[str]]) -> bool:
     """Check if two texts match, considering aliases."""
-    words1 = normalize_text(text1)
-    words2 = normalize_text(text2)
-
-    expanded1 = expand_with_aliases(words1, aliases)
-    expanded2 = expand_with_aliases(words2, aliases)
-
-    if expanded1 & expanded2:
-        return True
+    return words_match(match_words(text1, aliases), match_words(text2, aliases))
 
-    text1_lower = text1.lower().strip()
-    text2_lower = text2.lower().strip()
 
-    if text1_lower in aliases:
-        canonical1 = aliases[text1_lower]
-        if expanded2 & canonical1:
-            return True
-
-    if text2_lower in aliases:
-        canonical2 = aliases[text2_lower]
-        if expanded1 & canonical2:
-            return True
-
-    return False
+def _replace_file_lines(filepath: Path, lines: list[str]) -> None:
+    """Rewrite a file atomically, so it is never left half written."""
+    # Write next to the real file (not a symlink to it), keeping its permissions
+    target = filepath.resolve()
+    fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        with open(tmp_name, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+            # The data must be on disk before the rename, or a crash can
+            # leave an empty file in place of the diary
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(target, tmp_name)
+        os.replace(tmp_name, target)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
 
 
 def update_diary_with_reconciliation(
@@ -532,6 +707,10 @@ def update_diary_with_reconciliation(
     updated_counts = {}
 
     for filepath, matches in by_file.items():
+        updated_counts[filepath] = len(matches)
+        if dry_run:
+            continue
+
         with open(filepath, encoding='utf-8') as f:
             lines = f.readlines()
 
@@ -551,54 +730,64 @@ def update_diary_with_reconciliation(
                 line = line.replace(old_marker, new_marker)
             else:
                 if expense.currency != expense.bank_currency:
-                    marker = f" (reconciled: {expense.bank} - {expense.date.strftime('%Y-%m-%d')} - {expense.currency}:{expense.amount:.2f}/{expense.bank_currency}:{expense.deducted_amount:.2f})"
+                    marker = f" (reconciled: {expense.bank} - {expense.date_str} - {expense.currency}:{expense.amount_str}/{expense.bank_currency}:{expense.deducted_amount:.2f})"
                 else:
-                    marker = f" (reconciled: {expense.bank} - {expense.date.strftime('%Y-%m-%d')} - {expense.currency}:{expense.amount:.2f})"
+                    marker = f" (reconciled: {expense.bank} - {expense.date_str} - {expense.currency}:{expense.amount_str})"
                 line = line + marker
 
             lines[line_idx] = line + '\n'
 
-        if not dry_run:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.writelines(lines)
-
-        updated_counts[filepath] = len(matches)
+        _replace_file_lines(Path(filepath), lines)
 
     return updated_counts
 
 
-def find_split_match(
-    expense: Expense,
-    diary_expenses: list[DiaryExpense],
-    date_tolerance: int = 2
-) -> list[DiaryExpense] | None:
-    """Find diary expenses with split markers matching this bank expense."""
+def build_split_index(diary_expenses: list[DiaryExpense]) -> SplitIndex:
+    """Index diary expenses with split markers by bank, currency and date for find_split_match."""
     by_marker: dict[str, list[DiaryExpense]] = {}
     for diary_exp in diary_expenses:
         if diary_exp.split_marker:
             by_marker.setdefault(diary_exp.split_marker, []).append(diary_exp)
 
-    marker_pattern = re.compile(r'^(\w+)\s*-\s*(\d{4}-\d{2}-\d{2})\s*-\s*(\w+):(\d+\.?\d*)/(\d+)$')
-
-    for marker, diary_exps in by_marker.items():
-        match = marker_pattern.match(marker)
+    groups: dict[tuple[str, str], list[tuple[int, int, float, int, list[DiaryExpense]]]] = {}
+    for position, (marker, diary_exps) in enumerate(by_marker.items()):
+        match = _SPLIT_MARKER_FIELDS_RE.match(marker)
         if not match:
             continue
 
         bank, date_str, currency, amount_str, count_str = match.groups()
-        marker_date = datetime.strptime(date_str, '%Y-%m-%d')
-        marker_amount = float(amount_str)
-        expected_count = int(count_str)
-
-        if expense.bank != bank:
-            continue
-        if expense.currency != currency:
+        try:
+            marker_ordinal = parse_iso_date(date_str).toordinal()
+        except ValueError:
             continue
+        groups.setdefault((bank, currency), []).append(
+            (marker_ordinal, position, float(amount_str), int(count_str), diary_exps)
+        )
 
-        date_diff = abs((expense.date - marker_date).days)
-        if date_diff > date_tolerance:
-            continue
+    index: SplitIndex = {}
+    for key, entries in groups.items():
+        entries.sort(key=itemgetter(0, 1))
+        index[key] = ([e[0] for e in entries], [e[1:] for e in entries])
+    return index
+
+
+def find_split_match(
+    expense: Expense,
+    split_index: SplitIndex,
+    date_tolerance: int = 2
+) -> list[DiaryExpense] | None:
+    """Find diary expenses with split markers matching this bank expense."""
+    group = split_index.get((expense.bank, expense.currency))
+    if group is None:
+        return None
+    ordinals, entries = group
+
+    # Only markers within the date window can match
+    lo = bisect_left(ordinals, expense.date_ord - date_tolerance)
+    hi = bisect_right(ordinals, expense.date_ord + date_tolerance)
 
+    # Check markers in the order they first appear in the diaries
+    for _, marker_amount, expected_count, diary_exps in sorted(entries[lo:hi], key=itemgetter(0)):
         if abs(expense.amount - marker_amount) > 0.10:
             continue
 
@@ -610,9 +799,24 @@ def find_split_match(
     return None
 
 
+def build_diary_index(diary_expenses: list[DiaryExpense]) -> DiaryIndex:
+    """Index non-split diary expenses by currency and date for find_match."""
+    groups: dict[str, list[tuple[int, int, DiaryExpense]]] = {}
+    for position, diary_exp in enumerate(diary_expenses):
+        if diary_exp.split_marker:
+            continue
+        groups.setdefault(diary_exp.currency, []).append((diary_exp.date_ord, position, diary_exp))
+
+    index: DiaryIndex = {}
+    for currency, entries in groups.items():
+        entries.sort(key=itemgetter(0, 1))
+        index[currency] = ([e[0] for e in entries], [(e[1], e[2]) for e in entries])
+    return index
+
+
 def find_match(
     expense: Expense,
-    diary_expenses: list[DiaryExpense],
+    diary_index: DiaryIndex,
     amount_tolerance: float = 2.0,
     date_tolerance: int = 2,
     aliases: dict[str, set[str]] | None = None
@@ -621,18 +825,22 @@ def find_match(
     if aliases is None:
         aliases = {}
 
-    for diary_exp in diary_expenses:
-        if diary_exp.split_marker:
-            continue
+    group = diary_index.get(expense.currency)
+    if group is None:
+        return None
+    ordinals, entries = group
 
-        date_diff = abs((expense.date - diary_exp.date).days)
-        if date_diff > date_tolerance:
-            continue
+    # Only diary expenses within the date window can match
+    lo = bisect_left(ordinals, expense.date_ord - date_tolerance)
+    hi = bisect_right(ordinals, expense.date_ord + date_tolerance)
 
-        if expense.currency != diary_exp.currency:
-            continue
+    amount = expense.amount
+    expense_words = expense.words
 
-        amount_diff = abs(expense.amount - diary_exp.amount)
+    # Check candidates in diary order, so the first match wins as it would
+    # when scanning the diaries from the top
+    for _, diary_exp in sorted(entries[lo:hi], key=itemgetter(0)):
+        amount_diff = abs(amount - diary_exp.amount)
 
         if amount_diff > amount_tolerance:
             continue
@@ -640,51 +848,67 @@ def find_match(
         if amount_diff < 0.10:
             return diary_exp
 
-        if text_matches_with_aliases(expense.description, diary_exp.description, aliases):
+        if expense_words is None:
+            expense_words = match_words(expense.description, aliases)
+        diary_words = diary_exp.words
+        if diary_words is None:
+            diary_words = match_words(diary_exp.description, aliases)
+        if words_match(expense_words, diary_words):
             return diary_exp
 
     return None
 
 
-def load_existing_non_reconciled(filepath: Path) -> tuple[set[tuple], list[dict]]:
-    """Load existing entries from non-reconciled.csv for deduplication."""
-    existing = set()
+def _dedup_description(description: str) -> str:
+    """Get the description as used in deduplication keys."""
+    return description[5:] if description.startswith('ATM: ') else description
+
+
+def row_key(row: dict) -> tuple:
+    """Get deduplication key for a non-reconciled CSV row (commented out or not)."""
+    return (
+        row.get('date', '').lstrip('#'),
+        row.get('currency', ''),
+        row.get('amount', ''),
+        _dedup_description(row.get('description', '')),
+        row.get('bank', '')
+    )
+
+
+def _key_date(keyed_row: tuple[tuple, dict]) -> str:
+    """Sort key for (row_key(row), row) pairs: the date of the row."""
+    return keyed_row[0][0]
+
+
+def load_existing_non_reconciled(filepath: Path) -> tuple[list[dict], list[dict]]:
+    """Load existing entries from non-reconciled.csv.
+
+    Returns the active rows and the commented out (dismissed) rows.
+    Read errors are not caught: the file is rewritten from these rows, so
+    carrying on with a partial read would delete the rest of it.
+    """
+    active_rows = []
     commented_rows = []
 
     if not filepath.exists():
-        return existing, commented_rows
+        return active_rows, commented_rows
 
-    try:
-        with open(filepath, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                date = row.get('date', '')
-                desc = row.get('description', '')
-                if desc.startswith('ATM: '):
-                    desc = desc[5:]
-                key = (
-                    date.lstrip('#'),
-                    row.get('currency', ''),
-                    row.get('amount', ''),
-                    desc,
-                    row.get('bank', '')
-                )
-                existing.add(key)
-
-                if date.startswith('#'):
-                    commented_rows.append(row)
-    except (OSError, csv.Error) as e:
-        click.echo(f"Warning: Could not read {filepath}: {e}", err=True)
-
-    return existing, commented_rows
+    with open(filepath, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('date', '').startswith('#'):
+                commented_rows.append(row)
+            else:
+                active_rows.append(row)
+
+    return active_rows, commented_rows
 
 
 def expense_to_row(expense: Expense) -> dict:
     """Convert Expense to CSV row dict."""
     return {
-        'date': expense.date.strftime('%Y-%m-%d'),
+        'date': expense.date_str,
         'currency': expense.currency,
-        'amount': f'{expense.amount:.2f}',
+        'amount': expense.amount_str,
         'description': expense.description,
         'bank': expense.bank,
         'bank_currency': expense.bank_currency,
@@ -696,14 +920,11 @@ def expense_to_row(expense: Expense) -> dict:
 
 def expense_key(expense: Expense) -> tuple:
     """Get deduplication key for an expense."""
-    desc = expense.description
-    if desc.startswith('ATM: '):
-        desc = desc[5:]
     return (
-        expense.date.strftime('%Y-%m-%d'),
+        expense.date_str,
         expense.currency,
-        f'{expense.amount:.2f}',
-        desc,
+        expense.amount_str,
+        _dedup_description(expense.description),
         expense.bank
     )
 
@@ -711,7 +932,7 @@ def expense_key(expense: Expense) -> tuple:
 def row_to_expense(row: dict) -> Expense:
     """Convert CSV row dict back to Expense for matching."""
     return Expense(
-        date=datetime.strptime(row['date'], '%Y-%m-%d'),
+        date=parse_iso_date(row['date']),
         amount=float(row['amount']),
         currency=row['currency'],
         description=row['description'],
@@ -727,43 +948,28 @@ def row_to_expense(row: dict) -> Expense:
 def update_non_reconciled(
     new_unmatched: list[Expense],
     output_file: Path,
-    diary_expenses: list[DiaryExpense],
+    diary_index: DiaryIndex,
     amount_tolerance: float,
     date_tolerance: int,
     aliases: dict,
     dry_run: bool = False
 ) -> tuple[int, int, int]:
     """Update non-reconciled CSV file."""
-    existing_keys, commented_rows = load_existing_non_reconciled(output_file)
-
-    active_rows = []
-    if output_file.exists() and output_file.stat().st_size > 0:
-        with open(output_file, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                date = row.get('date', '')
-                if not date.startswith('#'):
-                    active_rows.append(row)
+    active_rows, commented_rows = load_existing_non_reconciled(output_file)
 
     still_unmatched = []
     removed = 0
     for row in active_rows:
         try:
             expense = row_to_expense(row)
-            match = find_match(expense, diary_expenses, amount_tolerance, date_tolerance, aliases)
-            if match:
-                removed += 1
-            else:
-                still_unmatched.append(row)
         except (ValueError, KeyError):
-            still_unmatched.append(row)
+            expense = None
+        if expense is not None and find_match(expense, diary_index, amount_tolerance, date_tolerance, aliases):
+            removed += 1
+        else:
+            still_unmatched.append((row_key(row), row))
 
-    existing_keys = {
-        (r['date'], r['currency'], r['amount'],
-         r['description'][5:] if r['description'].startswith('ATM: ') else r['description'],
-         r['bank'])
-        for r in still_unmatched
-    }
+    existing_keys = {key for key, _ in still_unmatched}
 
     new_rows = []
     duplicates = 0
@@ -772,39 +978,39 @@ def update_non_reconciled(
         if key in existing_keys:
             duplicates += 1
         else:
-            new_rows.append(expense_to_row(expense))
+            new_rows.append((key, expense_to_row(expense)))
             existing_keys.add(key)
 
     if dry_run:
         return len(new_rows), removed, duplicates
 
-    commented_keys = {
-        (r['date'].lstrip('#'), r['currency'], r['amount'],
-         r['description'][5:] if r['description'].startswith('ATM: ') else r['description'],
-         r['bank'])
-        for r in commented_rows
-    }
+    commented = [(row_key(r), r) for r in commented_rows]
+    commented_keys = {key for key, _ in commented}
 
-    all_active = [
-        r for r in (still_unmatched + new_rows)
-        if (r['date'], r['currency'], r['amount'],
-            r['description'][5:] if r['description'].startswith('ATM: ') else r['description'],
-            r['bank']) not in commented_keys
-    ]
-    all_active.sort(key=lambda r: r.get('date', ''))
-    commented_rows.sort(key=lambda r: r.get('date', '').lstrip('#'))
+    all_active = [(key, r) for key, r in still_unmatched + new_rows if key not in commented_keys]
+    # The keys start with the date (without the '#' of commented out rows)
+    all_active.sort(key=_key_date)
+    commented.sort(key=_key_date)
 
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=NON_RECONCILED_HEADER)
         writer.writeheader()
-        writer.writerows(all_active)
-        writer.writerows(commented_rows)
+        writer.writerows(r for _, r in all_active)
+        writer.writerows(r for _, r in commented)
 
     return len(new_rows), removed, duplicates
 
 
+def _read_bytes(filepath: Path) -> bytes | None:
+    """Read a file's content, or None if it doesn't exist."""
+    try:
+        return filepath.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
 @click.command()
 @click.argument('input_file', type=click.Path(exists=False, path_type=Path))
 @click.option('--format', '-f', 'fmt', type=click.Choice(['n26', 'wise', 'banknorwegian', 'remember']),
@@ -849,18 +1055,20 @@ def reconcile(input_file, fmt, diary, output, currency, tolerance, date_toleranc
     click.echo(f"Found {len(bank_expenses)} expenses")
 
     all_diary_expenses = []
+    all_reconciled_markers = set()
     for diary_file in diary_files:
         if diary_file.exists():
-            diary_expenses_list = parse_diary_expenses(diary_file)
+            diary_expenses_list, reconciled_markers = parse_diary(diary_file)
             all_diary_expenses.extend(diary_expenses_list)
+            all_reconciled_markers.update(reconciled_markers)
             if verbose and diary_expenses_list:
                 click.echo(f"Found {len(diary_expenses_list)} expenses in {diary_file}")
 
     click.echo(f"Found {len(all_diary_expenses)} total expenses in diaries")
+    precompute_match_words(all_diary_expenses, alias_dict)
+    diary_index = build_diary_index(all_diary_expenses)
+    split_index = build_split_index(all_diary_expenses)
 
-    all_reconciled_markers = set()
-    for diary_file in diary_files:
-        all_reconciled_markers.update(get_reconciled_markers(diary_file))
     if verbose and all_reconciled_markers:
         click.echo(f"Found {len(all_reconciled_markers)} existing reconciliation markers")
 
@@ -871,21 +1079,21 @@ def reconcile(input_file, fmt, diary, output, currency, tolerance, date_toleranc
     for expense in bank_expenses:
         marker_key = (
             expense.bank,
-            expense.date.strftime('%Y-%m-%d'),
+            expense.date_str,
             expense.currency,
-            f"{expense.amount:.2f}"
+            expense.amount_str
         )
         if marker_key in all_reconciled_markers:
             already_reconciled += 1
             continue
 
-        split_matches = find_split_match(expense, all_diary_expenses, date_tolerance=date_tolerance)
+        split_matches = find_split_match(expense, split_index, date_tolerance=date_tolerance)
         if split_matches:
             for diary_exp in split_matches:
                 matched.append((expense, diary_exp))
             continue
 
-        match = find_match(expense, all_diary_expenses, amount_tolerance=tolerance,
+        match = find_match(expense, diary_index, amount_tolerance=tolerance,
                            date_tolerance=date_tolerance, aliases=alias_dict)
         if match:
             matched.append((expense, match))
@@ -902,19 +1110,22 @@ def reconcile(input_file, fmt, diary, output, currency, tolerance, date_toleranc
     click.echo(f"Unmatched: {len(unmatched)}")
 
     if verbose or dry_run:
+        # One echo per list, click.echo() flushes after every call
         if matched:
             click.echo("\n--- Matched expenses ---")
-            for expense, diary_exp in matched:
-                click.echo(f"  {expense.date.strftime('%Y-%m-%d')} {expense.currency} {expense.amount:.2f} "
-                           f"'{expense.description}'")
-                click.echo(f"    -> {diary_exp.currency} {diary_exp.amount:.2f} "
-                           f"- {diary_exp.expense_type} - {diary_exp.description}")
+            click.echo("\n".join(
+                f"  {expense.date_str} {expense.currency} {expense.amount_str} '{expense.description}'\n"
+                f"    -> {diary_exp.currency} {diary_exp.amount:.2f} "
+                f"- {diary_exp.expense_type} - {diary_exp.description}"
+                for expense, diary_exp in matched
+            ))
 
         if unmatched:
             click.echo("\n--- Unmatched expenses (need manual review) ---")
-            for expense in unmatched:
-                click.echo(f"  {expense.date.strftime('%Y-%m-%d')} {expense.currency} {expense.amount:.2f} "
-                           f"'{expense.description}'")
+            click.echo("\n".join(
+                f"  {expense.date_str} {expense.currency} {expense.amount_str} '{expense.description}'"
+                for expense in unmatched
+            ))
 
     diary_updates = {}
     if matched:
@@ -925,10 +1136,17 @@ def reconcile(input_file, fmt, diary, output, currency, tolerance, date_toleranc
         elif verbose:
             click.echo(f"\nWould mark {len(matched)} diary entries as reconciled")
 
-    added, removed, duplicates = update_non_reconciled(
-        unmatched, output, all_diary_expenses,
-        tolerance, date_tolerance, alias_dict, dry_run=dry_run
-    )
+    # Remember the non-reconciled file, so it is only committed if this run changed it
+    commit = not no_commit and not dry_run
+    output_before = _read_bytes(output) if commit else None
+    try:
+        added, removed, duplicates = update_non_reconciled(
+            unmatched, output, diary_index,
+            tolerance, date_tolerance, alias_dict, dry_run=dry_run
+        )
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        click.echo(f"Error: Could not read {output}, leaving it unchanged: {e}", err=True)
+        sys.exit(1)
 
     if dry_run:
         if added or removed or duplicates:
@@ -950,8 +1168,10 @@ def reconcile(input_file, fmt, diary, output, currency, tolerance, date_toleranc
             if duplicates:
                 click.echo(f"  Skipped {duplicates} duplicates")
 
-    if not no_commit and not dry_run:
-        modified_files = [Path(f) for f in diary_updates.keys()] + [output]
+    if commit:
+        modified_files = [Path(f) for f in diary_updates.keys()]
+        if _read_bytes(output) != output_before:
+            modified_files.append(output)
         if modified_files:
             commit_msg = f"reconcile-expenses: {input_file.name}"
             if matched:
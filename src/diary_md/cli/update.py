@@ -26,6 +26,29 @@ def format_expense_line(amount: float, currency: str, expense_type: str, descrip
     return f"* {currency} {amount:.2f} - {expense_type} - {description}"
 
 
+def _write_lines(
+    diary_file: Path,
+    lines: list[str],
+    insert_at: int,
+    new_lines: list[str],
+    lf_only: bool
+) -> None:
+    """Write ``lines`` with ``new_lines`` inserted at ``insert_at``.
+
+    Inserting after the last line is the usual case (today's entry goes at
+    the end of the diary), so that appends to the file instead of rewriting it.
+    Appending is only done when the file uses LF line endings throughout
+    (``lf_only``); for CRLF or mixed files the rewrite normalizes them all to
+    LF, so the file never ends up with mixed line endings.
+    """
+    if lf_only and insert_at == len(lines):
+        with open(diary_file, "a") as f:
+            f.write("\n" + "\n".join(new_lines))
+    else:
+        with open(diary_file, "w") as f:
+            f.write("\n".join(lines[:insert_at] + new_lines + lines[insert_at:]))
+
+
 def update_diary(
     diary_file: Path,
     target_date: datetime,
@@ -40,6 +63,7 @@ def update_diary(
 
     with open(diary_file) as f:
         content = f.read()
+        lf_only = f.newlines in (None, "\n")
 
     lines = content.split("\n")
     date_line, date_exists = find_or_create_date_section(content, target_date)
@@ -56,7 +80,7 @@ def update_diary(
             "",
             line,
         ]
-        lines = lines[:date_line] + new_block + lines[date_line:]
+        insert_at = date_line
         action = f"Created new date section for {target_date.strftime('%Y-%m-%d')}"
     else:
         # Date exists, find or create section
@@ -72,7 +96,7 @@ def update_diary(
                 "",
                 line,
             ]
-            lines = lines[:section_end] + new_block + lines[section_end:]
+            insert_at = section_end
             action = f"Created new '{section}' section"
         else:
             # Section exists, add line at end of section
@@ -81,20 +105,20 @@ def update_diary(
             insert_at = section_end
             while insert_at > section_line and lines[insert_at - 1].strip() == "":
                 insert_at -= 1
-            lines.insert(insert_at, line)
+            new_block = [line]
             action = f"Added to existing '{section}' section"
 
-    new_content = "\n".join(lines)
-
     if dry_run:
+        lines[insert_at:insert_at] = new_block
         click.echo("=== DRY RUN ===")
         click.echo(f"Would update: {diary_file}")
         click.echo(f"Action: {action}")
         click.echo(f"Line: {line}")
         click.echo()
         # Show context
+        date_header = format_date_header(target_date)
         for i, current_line in enumerate(lines):
-            if line in current_line or format_date_header(target_date) in current_line:
+            if line in current_line or date_header in current_line:
                 start = max(0, i - 2)
                 end = min(len(lines), i + 3)
                 click.echo("Context:")
@@ -103,8 +127,7 @@ def update_diary(
                     click.echo(f"{marker} {j}: {lines[j]}")
                 break
     else:
-        with open(diary_file, "w") as f:
-            f.write(new_content)
+        _write_lines(diary_file, lines, insert_at, new_block, lf_only)
         click.echo(f"Updated {diary_file}")
         click.echo(action)
         click.echo(f"Added: {line}")
@@ -126,6 +149,7 @@ def ensure_section_exists(
 
     with open(diary_file) as f:
         content = f.read()
+        lf_only = f.newlines in (None, "\n")
 
     lines = content.split("\n")
     date_line, date_exists = find_or_create_date_section(content, target_date)
@@ -142,7 +166,7 @@ def ensure_section_exists(
             section_header,
             "",
         ]
-        lines = lines[:date_line] + new_block + lines[date_line:]
+        insert_at = date_line
         modified = True
         action = f"Created date section for {target_date.strftime('%Y-%m-%d')} with {section} subsection"
     else:
@@ -157,7 +181,7 @@ def ensure_section_exists(
                 section_header,
                 "",
             ]
-            lines = lines[:section_end] + new_block + lines[section_end:]
+            insert_at = section_end
             modified = True
             action = f"Created '{section}' section for {target_date.strftime('%Y-%m-%d')}"
         else:
@@ -170,9 +194,7 @@ def ensure_section_exists(
             click.echo("Would modify file")
     else:
         if modified:
-            new_content = "\n".join(lines)
-            with open(diary_file, "w") as f:
-                f.write(new_content)
+            _write_lines(diary_file, lines, insert_at, new_block, lf_only)
             click.echo(f"Updated {diary_file}")
         click.echo(action)
 
@@ -1,5 +1,8 @@
 """Exchange rate lookup for diary-md."""
 
+from bisect import bisect_right
+from operator import itemgetter
+
 # Exchange rates to EUR by time period
 # Format: { 'CUR': [('YYYY-MM-DD', rate), ...] }
 # Rates are looked up by finding the most recent date <= expense date
@@ -98,15 +101,11 @@ def get_exchange_rate(currency: str, date_str: str) -> float | None:
         return None
 
     rates = EXCHANGE_RATES_TO_EUR[currency]
-    # Find the most recent rate <= date
-    applicable_rate = None
-    for rate_date, rate in rates:
-        if rate_date <= date_str:
-            applicable_rate = rate
-        else:
-            break
-
-    return applicable_rate
+    # Find the most recent rate <= date (the rates are sorted by date)
+    i = bisect_right(rates, date_str, key=itemgetter(0))
+    if i == 0:
+        return None
+    return rates[i - 1][1]
 
 
 def convert_to_eur(amount: float, currency: str, date_str: str) -> float | None:
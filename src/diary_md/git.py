@@ -1,5 +1,6 @@
 """Git operations for diary-md."""
 
+import stat
 import subprocess
 from pathlib import Path
 
@@ -147,14 +148,21 @@ def git_commit_multiple_repos(
     Returns:
         Dict mapping repo root to success status
     """
-    # Group files by git repo
+    # Group files by git repo; files in the same directory share a
+    # repository, so look each directory up only once
     repos: dict[Path, list[Path]] = {}
+    dir_roots: dict[Path, Path | None] = {}
     for filepath in modified_files:
         filepath = Path(filepath)
-        if not filepath.exists():
+        try:
+            is_dir = stat.S_ISDIR(filepath.stat().st_mode)
+        except OSError:
             continue
 
-        repo_root = find_git_root(filepath)
+        directory = filepath if is_dir else filepath.parent
+        if directory not in dir_roots:
+            dir_roots[directory] = find_git_root(directory)
+        repo_root = dir_roots[directory]
         if repo_root:
             repos.setdefault(repo_root, []).append(filepath)
 
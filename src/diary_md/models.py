@@ -1,6 +1,7 @@
 """Data models for diary-md."""
 
 import re
+import sys
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -10,6 +11,7 @@ DATE_FORMAT = "%Y-%m-%d"
 WEEKDAYS_EN = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
 WEEKDAYS_NO = ('Mandag', 'Tirsdag', 'Onsdag', 'Torsdag', 'Fredag', 'Lørdag', 'Søndag')
 VALID_WEEKDAYS = WEEKDAYS_EN + WEEKDAYS_NO
+_VALID_WEEKDAY_SET = frozenset(VALID_WEEKDAYS)
 
 # Mapping from weekday name to day-of-week index (Monday=0, Sunday=6)
 WEEKDAY_TO_INDEX = {day: i for i, day in enumerate(WEEKDAYS_EN)}
@@ -21,8 +23,10 @@ SUPPORTED_CURRENCIES = (
     'HRK', 'RON', 'RSD', 'ALL', 'MKD', 'BAM',
 )
 
+SUPPORTED_CURRENCY_SET = frozenset(SUPPORTED_CURRENCIES)
 
-@dataclass
+
+@dataclass(slots=True)
 class DateHeader:
     """Represents a date header in the diary (## Monday 2026-01-20 - Location)."""
 
@@ -30,6 +34,8 @@ class DateHeader:
     weekday: str
     itinerary: str | None = None
 
+    _PATTERN = re.compile(r'^##\s+(\w+)\s+(\d{4}-\d{2}-\d{2})(.*)$')
+
     @classmethod
     def parse(cls, line: str) -> 'DateHeader | None':
         """Parse a date header line.
@@ -41,15 +47,14 @@ class DateHeader:
             ## Monday 2026-01-20 - Oslo
             ## Monday 2026-01-20 - Oslo - Bergen
         """
-        pattern = r'^##\s+(\w+)\s+(\d{4}-\d{2}-\d{2})(.*)$'
-        match = re.match(pattern, line.strip())
+        match = cls._PATTERN.match(line.strip())
         if not match:
             return None
 
         weekday, date_str, rest = match.groups()
 
         # Validate weekday
-        if weekday not in VALID_WEEKDAYS:
+        if weekday not in _VALID_WEEKDAY_SET:
             return None
 
         try:
@@ -75,7 +80,7 @@ class DateHeader:
         return self.format(include_itinerary=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class ExpenseLine:
     """Represents an expense line in the diary.
 
@@ -90,16 +95,20 @@ class ExpenseLine:
 
     # Pattern for parsing expense lines
     # Note: expense type can be multi-word like "harbour due", "taxi fare"
+    # The currency is checked against SUPPORTED_CURRENCY_SET after matching,
+    # which is cheaper than an alternation of all currencies in the regex
+    # The description ends at the first reconciliation marker, if any; the
+    # marker is captured and anything after it is dropped
+    # The expense type ends with a word character (or is a single space) so
+    # that a long run of whitespace is only scanned once, not once per char
     _PATTERN = re.compile(
-        r'^\*\s+(' + '|'.join(SUPPORTED_CURRENCIES) + r')\s+'
+        r'^\*\s+([A-Z]{3})\s+'
         r'(-?\d+(?:\.\d+)?)\s+-\s+'
-        r'([\w\s]+?)\s+-\s+'
-        r'(.+)$'
+        r'(\s|[\w\s]*?\w)\s+-\s+'
+        r'(.*?(?=\(reconciled:[^)]+\))|.+)'
+        r'(\(reconciled:[^)]+\))?.*$'
     )
 
-    # Pattern for reconciliation markers
-    _RECONCILED_PATTERN = re.compile(r'\(reconciled:[^)]+\)')
-
     @classmethod
     def parse(cls, line: str) -> 'ExpenseLine | None':
         """Parse an expense line.
@@ -107,29 +116,26 @@ class ExpenseLine:
         Returns ExpenseLine if line matches, None otherwise.
         """
         line = line.strip()
+        if not line.startswith('*'):
+            return None
         match = cls._PATTERN.match(line)
         if not match:
             return None
 
-        currency, amount_str, expense_type, description = match.groups()
+        currency, amount_str, expense_type, description, reconciliation_marker = match.groups()
+        if currency not in SUPPORTED_CURRENCY_SET:
+            return None
 
         try:
             amount = float(amount_str)
         except ValueError:
             return None
 
-        # Extract reconciliation marker if present
-        reconciliation_marker = None
-        marker_match = cls._RECONCILED_PATTERN.search(description)
-        if marker_match:
-            reconciliation_marker = marker_match.group(0)
-            # Remove marker from description for clean parsing
-            description = description[:marker_match.start()].strip()
-
+        # There are only a few distinct currencies and expense types
         return cls(
-            currency=currency,
+            currency=sys.intern(currency),
             amount=amount,
-            expense_type=expense_type.strip(),
+            expense_type=sys.intern(expense_type.strip()),
             description=description.strip(),
             reconciliation_marker=reconciliation_marker,
         )
@@ -41,6 +41,32 @@ class TestDigestExpenses:
 
         assert result.exit_code == 0
 
+    def test_expenses_paid_by_and_shared(self, tmp_path):
+        """Payer and DIV annotations are picked up in either order."""
+        diary_content = """\
+# Trip
+
+## Tuesday 2026-01-20
+
+### Expenses
+
+* EUR 30.00 - dinner - Restaurant - paid by anna - DIV3
+* EUR 10.00 - lunch (pizza) - Cafe - DIV2 - paid by bob
+"""
+        diary_file = tmp_path / "diary.md"
+        diary_file.write_text(diary_content)
+
+        runner = CliRunner()
+        result = runner.invoke(digest, ['--diary', str(diary_file), 'expenses'])
+
+        assert result.exit_code == 0
+        assert 'EUR 30.00 - anna' in result.output
+        assert 'EUR 10.00 - bob' in result.output
+        assert 'EUR 10.00 - dinner' in result.output
+        assert 'EUR  5.00 - lunch' in result.output
+        assert 'Shared expenses per head: EUR 15.00' in result.output
+        assert 'My expenses: EUR 15.00' in result.output
+
 
 class TestDigestFindAllSubsections:
     """Tests for diary-digest find-all-subsections command."""
@@ -0,0 +1,443 @@
+"""Tests for diary_md.cli.reconcile module."""
+
+import csv
+import zipfile
+from datetime import datetime
+
+import pytest
+from click.testing import CliRunner
+
+from diary_md.cli import reconcile as reconcile_module
+from diary_md.cli.reconcile import (
+    DiaryExpense,
+    Expense,
+    build_diary_index,
+    build_split_index,
+    find_match,
+    find_split_match,
+    get_reconciled_markers,
+    normalize_text,
+    parse_banknorwegian_xlsx,
+    parse_diary,
+    parse_diary_expenses,
+    parse_iso_date,
+    parse_n26_csv,
+    parse_wise_csv,
+    precompute_match_words,
+    reconcile,
+    update_diary_with_reconciliation,
+    update_non_reconciled,
+)
+
+
+def make_expense(date: str, amount: float, currency: str = 'EUR', description: str = 'Shop') -> Expense:
+    """Create a bank expense for testing."""
+    return Expense(
+        date=datetime.strptime(date, '%Y-%m-%d'),
+        amount=amount,
+        currency=currency,
+        description=description,
+        bank='N26',
+        bank_currency='EUR',
+        deducted_amount=amount,
+        source_file='bank.csv',
+        line_num=2,
+    )
+
+
+def make_diary_expense(
+    date: str, amount: float, currency: str = 'EUR', description: str = 'Shop', line_num: int = 1
+) -> DiaryExpense:
+    """Create a diary expense for testing."""
+    return DiaryExpense(
+        date=datetime.strptime(date, '%Y-%m-%d'),
+        amount=amount,
+        currency=currency,
+        expense_type='groceries',
+        description=description,
+        source_file='diary.md',
+        line_num=line_num,
+        original_line=f"* {currency} {amount:.2f} - groceries - {description}",
+    )
+
+
+class TestParseIsoDate:
+    """Tests for parse_iso_date function."""
+
+    def test_iso_date(self):
+        """A YYYY-MM-DD date is parsed to midnight."""
+        assert parse_iso_date('2026-01-20') == datetime(2026, 1, 20)
+
+    def test_same_as_strptime(self):
+        """Other input is accepted or rejected like datetime.strptime does."""
+        assert parse_iso_date('2026-1-5') == datetime(2026, 1, 5)
+        for date_str in ['2026-13-01', '2026-02-30', '2026-01-20 10:00', '+202-01-20']:
+            with pytest.raises(ValueError, match=r"does not match format|out of range|unconverted data"):
+                parse_iso_date(date_str)
+
+
+class TestParseN26Csv:
+    """Tests for parse_n26_csv function."""
+
+    def test_parse_expenses(self, sample_n26_csv):
+        """Parse card payments, using the original currency when present."""
+        expenses = parse_n26_csv(sample_n26_csv)
+        assert len(expenses) == 4
+        assert expenses[0].description == 'Lidl'
+        assert expenses[0].amount == 15.72
+        assert expenses[0].currency == 'EUR'
+        assert expenses[1].currency == 'NOK'
+        assert expenses[1].amount == 250.0
+        assert expenses[1].deducted_amount == 23.50
+
+    def test_row_longer_than_header(self, tmp_path):
+        """Values beyond the header are ignored, not read as a missing column."""
+        csv_file = tmp_path / "n26.csv"
+        csv_file.write_text(
+            "Value Date,Partner Name,Amount (EUR)\n"
+            "2026-01-20,Lidl,-15.72,extra1,NOK\n",
+            encoding='utf-8',
+        )
+        expenses = parse_n26_csv(csv_file)
+        assert [(e.currency, e.amount, e.description) for e in expenses] == [('EUR', 15.72, 'Lidl')]
+
+
+class TestParseWiseCsv:
+    """Tests for parse_wise_csv function."""
+
+    def test_parse_expenses(self, tmp_path):
+        """Parse completed outgoing transfers, tolerating missing columns and short or long rows."""
+        csv_file = tmp_path / "wise.csv"
+        csv_file.write_text(
+            "Status,Direction,Created on,Source amount (after fees),Target name,Note\n"
+            "COMPLETED,OUT,2026-01-20 10:00:00,5.50,Bakery,bread\n"
+            "\n"
+            "CANCELLED,OUT,2026-01-21,6.00,Shop,\n"
+            "COMPLETED,OUT,2026-01-22,7.00\n"
+            "COMPLETED,OUT,2026-01-23,8.00,Cafe,,NOK,1\n",
+            encoding='utf-8',
+        )
+        expenses = parse_wise_csv(csv_file)
+        assert [(e.date.day, e.amount, e.currency, e.description, e.line_num) for e in expenses] == [
+            (20, 5.5, 'EUR', 'Bakery (bread)', 2),
+            (22, 7.0, 'EUR', '', 4),
+            (23, 8.0, 'EUR', 'Cafe', 5),
+        ]
+
+
+class TestParseBanknorwegianXlsx:
+    """Tests for parse_banknorwegian_xlsx function."""
+
+    def test_parse_expenses(self, tmp_path):
+        """Parse purchases from the first worksheet, resolving shared strings."""
+        ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+        shared = f'<sst xmlns="{ns}"><si><t>Rema 1000</t></si><si><t>Kjøp</t></si><si><t>Innbetaling</t></si></sst>'
+        sheet = (
+            f'<worksheet xmlns="{ns}"><sheetData>'
+            '<row r="1"><c r="A1" t="inlineStr"><is><t>Date</t></is></c></row>'
+            '<row r="2"><c r="A2"><v>46042</v></c><c r="B2" t="s"><v>0</v></c><c r="C2" t="s"><v>1</v></c>'
+            '<c r="D2"><v>-123.5</v></c></row>'
+            '<row r="3"><c r="A3"><v>46043</v></c><c r="B3" t="s"><v>0</v></c><c r="C3" t="s"><v>2</v></c>'
+            '<c r="D3"><v>500</v></c></row>'
+            '</sheetData></worksheet>'
+        )
+        xlsx = tmp_path / "bn.xlsx"
+        with zipfile.ZipFile(xlsx, 'w') as zf:
+            zf.writestr('xl/sharedStrings.xml', shared)
+            zf.writestr('xl/worksheets/sheet1.xml', sheet)
+
+        expenses = parse_banknorwegian_xlsx(xlsx)
+        assert len(expenses) == 1
+        assert expenses[0].date == datetime(2026, 1, 20)
+        assert expenses[0].description == 'Rema 1000'
+        assert expenses[0].amount == 123.5
+        assert expenses[0].currency == 'NOK'
+        assert expenses[0].line_num == 2
+
+
+class TestParseDiaryExpenses:
+    """Tests for parse_diary_expenses function."""
+
+    def test_skips_reconciled_and_cash(self, tmp_path):
+        """Expenses already reconciled or paid in cash are skipped, split markers are kept."""
+        diary = tmp_path / "diary.md"
+        diary.write_text(
+            "* EUR 1.00 - groceries - Before any date\n"
+            "## Tuesday 2026-01-20\n"
+            "* EUR 15.72 - groceries - Lidl\n"
+            "* EUR 3.00 - food - Cafe (reconciled: N26 - 2026-01-20 - EUR:3.00)\n"
+            "* EUR 4.00 - food - Kiosk (cash)\n"
+            "* EUR 3.00 - food - Pizza (N26 - 2026-01-20 - EUR:6.00/2)\n"
+            "* EUR 3.00 - food - Pizza (reconciled: N26 - 2026-01-20 - EUR:6.00/2)\n",
+            encoding='utf-8',
+        )
+        expenses = parse_diary_expenses(diary)
+        assert [(e.description, e.line_num) for e in expenses] == [
+            ('Lidl', 3),
+            ('Pizza (N26 - 2026-01-20 - EUR:6.00/2)', 6),
+        ]
+        assert expenses[0].date == datetime(2026, 1, 20)
+        assert expenses[0].expense_type == 'groceries'
+        assert expenses[1].split_marker == 'N26 - 2026-01-20 - EUR:6.00/2'
+
+
+class TestGetReconciledMarkers:
+    """Tests for get_reconciled_markers function."""
+
+    def test_markers_and_unreadable_file(self, tmp_path):
+        """Markers are collected from any line; a missing or unreadable file gives no markers."""
+        diary = tmp_path / "diary.md"
+        diary.write_text(
+            "## Tuesday 2026-01-20\n"
+            "* EUR 3.00 - food - Cafe (reconciled: N26 - 2026-01-20 - EUR:3)\n"
+            "Paid back (reconciled: Wise - 2026-01-21 - NOK:10.5/2)\n",
+            encoding='utf-8',
+        )
+        assert get_reconciled_markers(diary) == {
+            ('N26', '2026-01-20', 'EUR', '3.00'),
+            ('Wise', '2026-01-21', 'NOK', '10.50'),
+        }
+        assert get_reconciled_markers(tmp_path / "missing.md") == set()
+        assert get_reconciled_markers(tmp_path) == set()
+
+
+class TestParseDiary:
+    """Tests for parse_diary function."""
+
+    def test_expenses_and_markers(self, tmp_path):
+        """Expenses and existing reconciliation markers are collected in the same pass."""
+        diary = tmp_path / "diary.md"
+        diary.write_text(
+            "## Tuesday 2026-01-20\n"
+            "* EUR 15.72 - groceries - Lidl\n"
+            "* EUR 3.00 - food - Cafe (reconciled: N26 - 2026-01-20 - EUR:3)\n"
+            "Moved to savings (reconciled: Wise - 2026-01-20 - NOK:100.00/EUR:9.00)\n",
+            encoding='utf-8',
+        )
+        expenses, markers = parse_diary(diary)
+        assert [e.description for e in expenses] == ['Lidl']
+        assert markers == {('N26', '2026-01-20', 'EUR', '3.00'), ('Wise', '2026-01-20', 'NOK', '100.00')}
+
+    def test_line_numbers(self, tmp_path):
+        """Line numbers count newlines only, as update_diary_with_reconciliation does."""
+        diary = tmp_path / "diary.md"
+        with open(diary, 'w', encoding='utf-8', newline='') as f:
+            f.write("## Tuesday 2026-01-20\r\nSome\x0cnotes\u2028here\r\n* EUR 15.72 - groceries - Lidl\n")
+        expenses, _ = parse_diary(diary)
+        assert expenses[0].line_num == 3
+        assert expenses[0].original_line == "* EUR 15.72 - groceries - Lidl"
+
+    def test_missing_file(self, tmp_path):
+        """A missing diary has no expenses and no markers."""
+        assert parse_diary(tmp_path / "missing.md") == ([], set())
+
+
+class TestNormalizeText:
+    """Tests for normalize_text function."""
+
+    def test_words(self):
+        """Words are lowercased, short and noise words dropped."""
+        assert normalize_text('REMA 1000 Storgata, Oslo NO - the card') == {'rema', '1000', 'storgata', 'oslo', 'card'}
+
+
+class TestFindMatch:
+    """Tests for find_match function."""
+
+    def test_exact_amount_match(self):
+        """Matching amount within the date window matches."""
+        diary = [make_diary_expense('2026-01-20', 15.72, description='Lidl')]
+        match = find_match(make_expense('2026-01-21', 15.72, description='LIDL'), build_diary_index(diary))
+        assert match is diary[0]
+
+    def test_outside_date_tolerance(self):
+        """Expenses too far apart in time don't match."""
+        diary = [make_diary_expense('2026-01-20', 15.72)]
+        index = build_diary_index(diary)
+        assert find_match(make_expense('2026-01-23', 15.72), index, date_tolerance=2) is None
+        assert find_match(make_expense('2026-01-23', 15.72), index, date_tolerance=3) is diary[0]
+
+    def test_currency_must_match(self):
+        """Expenses in different currencies don't match."""
+        diary = [make_diary_expense('2026-01-20', 15.72, currency='NOK')]
+        assert find_match(make_expense('2026-01-20', 15.72), build_diary_index(diary)) is None
+
+    def test_first_in_diary_order_wins(self):
+        """When several diary expenses match, the first one in the diary wins."""
+        diary = [
+            make_diary_expense('2026-01-21', 10.00, line_num=1),
+            make_diary_expense('2026-01-19', 10.00, line_num=2),
+        ]
+        match = find_match(make_expense('2026-01-20', 10.00), build_diary_index(diary))
+        assert match is diary[0]
+
+    def test_text_match_with_aliases(self):
+        """Approximate amounts need a description match, aliases included."""
+        diary = [make_diary_expense('2026-01-20', 12.00, description='Pizzeria Roma')]
+        index = build_diary_index(diary)
+        aliases = {'pizza': {'pizzeria'}, 'pizzeria': {'pizzeria'}}
+        assert find_match(make_expense('2026-01-20', 12.50, description='Kebab'), index, aliases=aliases) is None
+        match = find_match(make_expense('2026-01-20', 12.50, description='PIZZA'), index, aliases=aliases)
+        assert match is diary[0]
+
+    def test_precomputed_words(self):
+        """Precomputed match words give the same result as computing on the fly."""
+        diary = [make_diary_expense('2026-01-20', 12.00, description='Pizzeria Roma')]
+        aliases = {'pizza': {'pizzeria'}, 'pizzeria': {'pizzeria'}}
+        precompute_match_words(diary, aliases)
+        assert diary[0].words == ({'pizzeria', 'roma'}, set())
+        index = build_diary_index(diary)
+        match = find_match(make_expense('2026-01-20', 12.50, description='PIZZA'), index, aliases=aliases)
+        assert match is diary[0]
+
+    def test_split_expenses_not_indexed(self):
+        """Diary expenses with split markers are left to find_split_match."""
+        diary_exp = make_diary_expense('2026-01-20', 3.00)
+        diary_exp.split_marker = 'N26 - 2026-01-20 - EUR:6.00/2'
+        assert find_match(make_expense('2026-01-20', 3.00), build_diary_index([diary_exp])) is None
+
+
+class TestFindSplitMatch:
+    """Tests for find_split_match function."""
+
+    def split_expenses(self, marker: str, count: int) -> list[DiaryExpense]:
+        """Create diary expenses sharing a split marker."""
+        expenses = [make_diary_expense('2026-01-20', 3.00, line_num=i) for i in range(count)]
+        for diary_exp in expenses:
+            diary_exp.split_marker = marker
+        return expenses
+
+    def test_complete_split_matches(self):
+        """All diary expenses of a complete split match the bank expense."""
+        diary = self.split_expenses('N26 - 2026-01-20 - EUR:6.00/2', 2)
+        index = build_split_index(diary)
+        assert find_split_match(make_expense('2026-01-21', 6.00), index) == diary
+        assert find_split_match(make_expense('2026-01-23', 6.00), index) is None
+        assert find_split_match(make_expense('2026-01-21', 7.00), index) is None
+
+    def test_incomplete_split_does_not_match(self):
+        """A split with fewer diary expenses than announced doesn't match."""
+        index = build_split_index(self.split_expenses('N26 - 2026-01-20 - EUR:6.00/3', 2))
+        assert find_split_match(make_expense('2026-01-20', 6.00), index) is None
+
+    def test_bank_must_match(self):
+        """The marker's bank must be the bank of the expense."""
+        index = build_split_index(self.split_expenses('Wise - 2026-01-20 - EUR:6.00/2', 2))
+        assert find_split_match(make_expense('2026-01-20', 6.00), index) is None
+
+
+class TestUpdateDiaryWithReconciliation:
+    """Tests for update_diary_with_reconciliation function."""
+
+    def test_marks_matched_lines(self, tmp_path):
+        """Matched lines get a marker; the diary is rewritten through symlinks, keeping its mode."""
+        diary = tmp_path / "diary.md"
+        diary.write_text("## Tuesday 2026-01-20\n* EUR 15.72 - groceries - Lidl\n* EUR 5.00 - food - Kiosk\n",
+                         encoding='utf-8')
+        diary.chmod(0o640)
+        link = tmp_path / "link.md"
+        link.symlink_to(diary)
+
+        diary_exp = parse_diary_expenses(link)[0]
+        counts = update_diary_with_reconciliation([(make_expense('2026-01-20', 15.72), diary_exp)])
+
+        assert counts == {str(link): 1}
+        assert link.is_symlink()
+        assert diary.stat().st_mode & 0o777 == 0o640
+        assert diary.read_text(encoding='utf-8').splitlines()[1:] == [
+            "* EUR 15.72 - groceries - Lidl (reconciled: N26 - 2026-01-20 - EUR:15.72)",
+            "* EUR 5.00 - food - Kiosk",
+        ]
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['diary.md', 'link.md']
+
+    def test_failed_write_leaves_diary_untouched(self, tmp_path, monkeypatch):
+        """If writing the new content fails, the diary is unchanged and the temp file is removed."""
+        diary = tmp_path / "diary.md"
+        content = "## Tuesday 2026-01-20\n* EUR 15.72 - groceries - Lidl\n"
+        diary.write_text(content, encoding='utf-8')
+        diary_exp = parse_diary_expenses(diary)[0]
+
+        def failing_fsync(fd):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(reconcile_module.os, 'fsync', failing_fsync)
+        with pytest.raises(OSError, match="disk full"):
+            update_diary_with_reconciliation([(make_expense('2026-01-20', 15.72), diary_exp)])
+
+        assert diary.read_text(encoding='utf-8') == content
+        assert [p.name for p in tmp_path.iterdir()] == ['diary.md']
+
+    def test_dry_run(self, tmp_path):
+        """Nothing is written in dry run mode."""
+        diary = tmp_path / "diary.md"
+        content = "## Tuesday 2026-01-20\n* EUR 15.72 - groceries - Lidl\n"
+        diary.write_text(content, encoding='utf-8')
+        diary_exp = parse_diary_expenses(diary)[0]
+        update_diary_with_reconciliation([(make_expense('2026-01-20', 15.72), diary_exp)], dry_run=True)
+        assert diary.read_text(encoding='utf-8') == content
+
+
+class TestUpdateNonReconciled:
+    """Tests for update_non_reconciled function."""
+
+    def test_dedup_and_commented_rows(self, tmp_path):
+        """Known and dismissed expenses aren't added again, matched ones are removed."""
+        output = tmp_path / "non-reconciled.csv"
+        output.write_text(
+            "date,currency,amount,description,bank,bank_currency,deducted_amount,merchant_category,source_file\n"
+            "2026-01-20,EUR,15.72,Lidl,N26,EUR,15.72,,old.csv\n"
+            "2026-01-21,EUR,5.00,Kiosk,N26,EUR,5.00,,old.csv\n"
+            "#2026-01-22,EUR,50.00,Withdrawal,N26,EUR,50.00,,old.csv\n",
+            encoding='utf-8',
+        )
+        index = build_diary_index([make_diary_expense('2026-01-21', 5.00, description='Kiosk')])
+        new_unmatched = [
+            make_expense('2026-01-20', 15.72, description='Lidl'),
+            make_expense('2026-01-22', 50.00, description='ATM: Withdrawal'),
+            make_expense('2026-01-23', 7.00, description='Bakery'),
+        ]
+        added, removed, duplicates = update_non_reconciled(new_unmatched, output, index, 2.0, 2, {})
+        assert (added, removed, duplicates) == (2, 1, 1)
+        lines = output.read_text(encoding='utf-8').splitlines()
+        assert [line.split(',')[:4] for line in lines[1:]] == [
+            ['2026-01-20', 'EUR', '15.72', 'Lidl'],
+            ['2026-01-23', 'EUR', '7.00', 'Bakery'],
+            ['#2026-01-22', 'EUR', '50.00', 'Withdrawal'],
+        ]
+
+    def test_unreadable_file_not_rewritten(self, tmp_path):
+        """A read error is raised instead of rewriting the file from the rows read before it."""
+        output = tmp_path / "non-reconciled.csv"
+        content = (
+            "date,currency,amount,description,bank,bank_currency,deducted_amount,merchant_category,source_file\n"
+            "2026-01-20,EUR,15.72,Lidl,N26,EUR,15.72,,old.csv\n"
+            f"2026-01-21,EUR,5.00,{'x' * 200_000},N26,EUR,5.00,,old.csv\n"
+            "2026-01-22,EUR,6.00,Bakery,N26,EUR,6.00,,old.csv\n"
+            "#2026-01-23,EUR,50.00,Withdrawal,N26,EUR,50.00,,old.csv\n"
+        )
+        output.write_text(content, encoding='utf-8')
+        index = build_diary_index([])
+        with pytest.raises(csv.Error, match="field larger than field limit"):
+            update_non_reconciled([make_expense('2026-01-24', 7.00)], output, index, 2.0, 2, {})
+        assert output.read_text(encoding='utf-8') == content
+
+
+class TestReconcileCommand:
+    """Tests for the diary-reconcile command."""
+
+    def test_commit_only_changed_files(self, tmp_path, monkeypatch, sample_diary_file, sample_n26_csv):
+        """Files are committed only when the run changed them."""
+        commits = []
+        monkeypatch.setattr(reconcile_module, 'git_commit_multiple_repos',
+                            lambda files, message: commits.append(files))
+        monkeypatch.setenv('HOME', str(tmp_path))
+        output = tmp_path / "non-reconciled.csv"
+        args = [str(sample_n26_csv), '--diary', str(sample_diary_file), '--output', str(output)]
+        runner = CliRunner()
+
+        result = runner.invoke(reconcile, args)
+        assert result.exit_code == 0
+        assert commits == [[sample_diary_file, output]]
+
+        result = runner.invoke(reconcile, args)
+        assert result.exit_code == 0
+        assert len(commits) == 1
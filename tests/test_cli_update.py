@@ -0,0 +1,76 @@
+"""Tests for diary_md.cli.update module."""
+
+from datetime import datetime
+
+from diary_md.cli.update import ensure_section_exists, update_diary
+
+
+class TestUpdateDiary:
+    """Tests for update_diary function."""
+
+    def test_append_new_date_at_end(self, tmp_path):
+        """A date after all existing entries is appended to the file."""
+        diary = tmp_path / "diary.md"
+        diary.write_text("## Tuesday 2026-01-20\n\n### Expenses\n\n* EUR 1.00 - a - b\n")
+
+        update_diary(diary, datetime(2026, 1, 21), "expenses", "* EUR 2.00 - c - d")
+
+        assert diary.read_text() == (
+            "## Tuesday 2026-01-20\n\n### Expenses\n\n* EUR 1.00 - a - b\n"
+            "\n\n## Wednesday 2026-01-21\n\n### Expenses\n\n* EUR 2.00 - c - d"
+        )
+
+    def test_append_to_crlf_file_normalizes_line_endings(self, tmp_path):
+        """A CRLF diary is rewritten with LF line endings rather than appended to."""
+        diary = tmp_path / "diary.md"
+        diary.write_bytes(b"## Tuesday 2026-01-20\r\n\r\n### Expenses\r\n\r\n* EUR 1.00 - a - b\r\n")
+
+        update_diary(diary, datetime(2026, 1, 21), "expenses", "* EUR 2.00 - c - d")
+
+        assert diary.read_bytes() == (
+            b"## Tuesday 2026-01-20\n\n### Expenses\n\n* EUR 1.00 - a - b\n"
+            b"\n\n## Wednesday 2026-01-21\n\n### Expenses\n\n* EUR 2.00 - c - d"
+        )
+
+    def test_insert_into_existing_section(self, tmp_path):
+        """A line is added after the last entry of an existing section."""
+        diary = tmp_path / "diary.md"
+        diary.write_text("## Tuesday 2026-01-20\n\n### Expenses\n\n* EUR 1.00 - a - b\n\n## Wednesday 2026-01-21\n")
+
+        update_diary(diary, datetime(2026, 1, 20), "expenses", "* EUR 2.00 - c - d")
+
+        assert diary.read_text() == (
+            "## Tuesday 2026-01-20\n\n### Expenses\n\n* EUR 1.00 - a - b\n* EUR 2.00 - c - d\n\n"
+            "## Wednesday 2026-01-21\n"
+        )
+
+    def test_dry_run_leaves_file_unchanged(self, tmp_path):
+        """Dry run shows the change without writing it."""
+        diary = tmp_path / "diary.md"
+        content = "## Tuesday 2026-01-20\n"
+        diary.write_text(content)
+
+        update_diary(diary, datetime(2026, 1, 21), "expenses", "* EUR 2.00 - c - d", dry_run=True)
+
+        assert diary.read_text() == content
+
+
+class TestEnsureSectionExists:
+    """Tests for ensure_section_exists function."""
+
+    def test_creates_section_before_next_date(self, tmp_path):
+        """A missing section is created at the end of its date entry."""
+        diary = tmp_path / "diary.md"
+        diary.write_text("## Tuesday 2026-01-20\n\nNotes.\n\n## Wednesday 2026-01-21\n")
+
+        assert ensure_section_exists(diary, datetime(2026, 1, 20), "expenses")
+        assert diary.read_text() == "## Tuesday 2026-01-20\n\nNotes.\n\n\n### Expenses\n\n## Wednesday 2026-01-21\n"
+
+    def test_existing_section_not_modified(self, tmp_path):
+        """Nothing is written when the section already exists."""
+        diary = tmp_path / "diary.md"
+        content = "## Tuesday 2026-01-20\n\n### Expenses\n"
+        diary.write_text(content)
+
+        assert not ensure_section_exists(diary, datetime(2026, 1, 20), "expenses")
+        assert diary.read_text() == content
@@ -105,6 +105,15 @@ class TestExpenseLine:
         assert expense.reconciliation_marker == "(reconciled: N26 - 2026-01-20 - EUR:15.72)"
         assert expense.is_reconciled
 
+    def test_parse_expense_with_text_after_reconciliation(self):
+        """The description ends at the first reconciliation marker."""
+        expense = ExpenseLine.parse(
+            "* EUR 15.72 - groceries - Lidl (reconciled: N26 - 2026-01-20 - EUR:15.72) (reconciled: x) bread"
+        )
+        assert expense is not None
+        assert expense.description == "Lidl"
+        assert expense.reconciliation_marker == "(reconciled: N26 - 2026-01-20 - EUR:15.72)"
+
     def test_parse_different_currencies(self):
         """Parse expenses in different currencies."""
         currencies = ['EUR', 'BGN', 'NOK', 'USD', 'GBP', 'SEK', 'TRY', 'PLN']
@@ -138,6 +147,13 @@ class TestExpenseLine:
         assert ExpenseLine.parse("* Not an expense") is None
         assert ExpenseLine.parse("* XXX 10.00 - invalid currency - desc") is None
 
+    def test_parse_long_whitespace_run(self):
+        """A long whitespace run without a separator is rejected in linear time."""
+        assert ExpenseLine.parse("* EUR 10.00 - food" + " " * 100_000 + "x") is None
+        expense = ExpenseLine.parse("* EUR 10.00 - food" + " " * 1000 + "- Lunch")
+        assert expense is not None
+        assert expense.expense_type == "food"
+
     def test_format_simple(self):
         """Format a simple expense line."""
         expense = ExpenseLine(
@@ -12,6 +12,7 @@ from diary_md.parser import (
     find_section_in_date,
     markdown_to_dict,
     parse_diary_expenses,
+    parse_diary_to_list,
 )
 
 
@@ -71,6 +72,22 @@ More content.
         assert '__content__' in result['Header']
         assert 'Some content here.' in result['Header']['__content__']
 
+    def test_file_positions(self, tmp_path):
+        """File positions count characters, reading from a file or a StringIO alike."""
+        content = "# Trip\n\n## Mandag 2026-01-19 - Ålesund\n\nNotes\n## Tuesday 2026-01-20\n"
+        diary = tmp_path / "diary.md"
+        diary.write_text(content, encoding='utf-8')
+        with open(diary, encoding='utf-8') as f:
+            result = markdown_to_dict(f)
+        days = result['Trip']
+        assert days['Mandag 2026-01-19 - Ålesund']['__file_position__'] == content.index('## Tuesday')
+        assert days['Tuesday 2026-01-20']['__file_position__'] == len(content)
+        assert days['Mandag 2026-01-19 - Ålesund']['__file_name__'] == str(diary)
+
+        stream = StringIO(content)
+        stream.name = str(diary)
+        assert markdown_to_dict(stream) == result
+
     def test_invalid_header_jump(self):
         """Invalid header level jump raises error."""
         content = """\
@@ -83,6 +100,36 @@ More content.
         assert "Invalid header level jump" in str(exc_info.value)
 
 
+class TestParseDiaryToList:
+    """Tests for parse_diary_to_list function."""
+
+    def test_entries_in_date_order(self):
+        """Entries are listed by date, with trip and itinerary."""
+        content = "# Trip\n## Tuesday 2026-01-20 - Oslo\n## Wednesday 2026-01-21\n"
+        entries = parse_diary_to_list(markdown_to_dict(StringIO(content)))
+        assert [(e['trip'], e['date'], e['itenary']) for e in entries] == [
+            ('Trip', '2026-01-20', ' - Oslo'),
+            ('Trip', '2026-01-21', ''),
+        ]
+
+    def test_norwegian_and_unknown_weekdays(self):
+        """Norwegian weekday names are accepted, unknown names are rejected."""
+        entries = parse_diary_to_list(markdown_to_dict(StringIO("# Trip\n## Tirsdag 2026-01-20\n")))
+        assert entries[0]['dow'] == 'Tirsdag'
+
+        with pytest.raises(DiaryParseError) as exc_info:
+            parse_diary_to_list(markdown_to_dict(StringIO("# Trip\n## Tuesdai 2026-01-20\n")))
+        assert "Unknown weekday 'Tuesdai'" in str(exc_info.value)
+
+    def test_duplicate_date_reported_at_later_section(self):
+        """A repeated date is reported for the later section, also past position 99."""
+        content = "# Trip\n## Tuesday 2026-01-20 - Oslo\n## Tuesday 2026-01-20 - Bergen\n" + "x" * 100 + "\n"
+        with pytest.raises(DiaryParseError) as exc_info:
+            parse_diary_to_list(markdown_to_dict(StringIO(content)))
+        assert exc_info.value.section == "Tuesday 2026-01-20  - Bergen"
+        assert exc_info.value.file_position == len(content)
+
+
 class TestFindOrCreateDateSection:
     """Tests for find_or_create_date_section function."""
 